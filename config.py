@@ -25,3 +25,63 @@ PRICE_MARKUP = float(os.getenv("PRICE_MARKUP", "1.10"))
 # Интервал проверки скидок (в секундах)
 # 3600 = 1 час
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "3600"))
+
+# Задержка перед прогревом кэшей после запуска (в секундах)
+WARMUP_DELAY = int(os.getenv("WARMUP_DELAY", "5"))
+
+# Сколько секунд прогрев может загружать цены игр из watchlist
+WARMUP_BUDGET = float(os.getenv("WARMUP_BUDGET", "30"))
+
+# Задержка перед первой автопроверкой после запуска (в секундах)
+FIRST_CHECK_DELAY = int(os.getenv("FIRST_CHECK_DELAY", "60"))
+
+# Автопроверка не запрашивает заново цены, полученные не раньше чем столько
+# секунд назад: первая проверка после запуска берёт результаты прогрева.
+# Должно быть меньше CHECK_INTERVAL, иначе проверки будут видеть старые цены
+PRICE_REUSE_AGE = int(os.getenv("PRICE_REUSE_AGE", "300"))
+
+# === МАССОВЫЙ ИМПОРТ ===
+# Максимум App ID за один импорт
+BULK_IMPORT_LIMIT = int(os.getenv("BULK_IMPORT_LIMIT", "500"))
+
+# Потоки общего пула импорта (один на все импорты сразу)
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "4"))
+
+# Интервал между запросами импорта к Steam (в секундах), общий для всех
+# импортов - чтобы не упираться в ограничение частоты appdetails
+BULK_REQUEST_INTERVAL = float(os.getenv("BULK_REQUEST_INTERVAL", "0.25"))
+
+# === СОБЫТИЯ ===
+# Журнал событий о ценах для других программ (пустая строка - выключен)
+EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", os.path.join(os.path.dirname(__file__), "events.jsonl"))
+
+# Размер журнала, после которого он обнуляется (если все подписчики дочитали)
+EVENT_LOG_ROTATE_BYTES = int(os.getenv("EVENT_LOG_ROTATE_BYTES", str(1024 * 1024)))
+
+# Отставание подписчика (в байтах), после которого изменения цен не пишутся
+EVENT_LOG_MAX_LAG = int(os.getenv("EVENT_LOG_MAX_LAG", str(10 * 1024 * 1024)))
+
+# === ПЕРЕГРУЗКА ===
+# Таймаут одного запроса к Steam (в секундах)
+STEAM_TIMEOUT = float(os.getenv("STEAM_TIMEOUT", "10"))
+
+# Общий бюджет на цены одной игры (запросы UAH + RUB вместе)
+STEAM_REQUEST_BUDGET = float(os.getenv("STEAM_REQUEST_BUDGET", "12"))
+
+# Бюджет на /check и /watchlist целиком - дальше цены берутся из кэша
+USER_REQUEST_BUDGET = float(os.getenv("USER_REQUEST_BUDGET", "30"))
+
+# Бюджет на проверку всех App ID в /import
+BULK_IMPORT_BUDGET = float(os.getenv("BULK_IMPORT_BUDGET", "60"))
+
+# Бюджет на обход игр со скидками в /check (списки магазина + цены игр),
+# по умолчанию как у остальных запросов пользователя
+CRAWL_BUDGET = float(os.getenv("CRAWL_BUDGET", str(USER_REQUEST_BUDGET)))
+
+# После стольких сбоев подряд Steam не опрашивается STEAM_BREAKER_COOLDOWN секунд
+STEAM_BREAKER_FAILURES = int(os.getenv("STEAM_BREAKER_FAILURES", "5"))
+STEAM_BREAKER_COOLDOWN = int(os.getenv("STEAM_BREAKER_COOLDOWN", "60"))
+
+# Потоки для запросов пользователей к Steam и максимум запросов в работе/очереди
+STEAM_WORKERS = int(os.getenv("STEAM_WORKERS", "8"))
+STEAM_QUEUE_LIMIT = int(os.getenv("STEAM_QUEUE_LIMIT", "16"))
@@ -0,0 +1,262 @@
+"""
+Steam Discount Bot - Локальный поток событий о ценах
+Журнал событий (JSON Lines) с позициями подписчиков
+
+Проверка скидок публикует сюда изменения цен и найденные скидки,
+а другие программы читают журнал без собственных запросов к Steam:
+
+    python events.py tail analytics      # читать новые события
+    python events.py lag                 # отставание подписчиков
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import config
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировка только внутри процесса
+    fcntl = None
+
+
+# Типы событий
+PRICE_CHANGE = "price_change"
+DEAL = "deal"
+
+# Какие события можно отбросить, если подписчики не успевают читать
+DROPPABLE_TYPES = {PRICE_CHANGE}
+
+
+class EventLog:
+    """
+    Журнал событий только на дозапись.
+
+    Позиция подписчика - абсолютное смещение в байтах от начала потока.
+    Когда все подписчики дочитали журнал, файл обнуляется, а смещение
+    его начала ("base") сдвигается, поэтому позиции остаются верными.
+    Состояние хранится рядом с журналом, доступ защищён flock, так что
+    писать и читать можно из разных процессов (на Windows - только
+    из одного процесса).
+
+    Там же хранятся последние опубликованные цены, чтобы после
+    перезапуска не повторять старые скидки и не терять изменения цен.
+    """
+
+    def __init__(self, path: str = config.EVENT_LOG_PATH):
+        self.path = path
+        self.state_path = path + ".offsets"
+        self.published_path = path + ".published"
+        self.lock_path = path + ".lock"
+        self._thread_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        if fcntl is None:
+            with self._thread_lock:
+                yield
+            return
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"base": 0, "consumers": {}}
+
+    def _save_state(self, state: dict):
+        self._write_json(self.state_path, state)
+
+    def _write_json(self, path: str, data: dict):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load_published(self) -> dict:
+        """Последние опубликованные цены (как их сохранил publish)"""
+        with self._locked():
+            try:
+                with open(self.published_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return {}
+
+    def _file_size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _lag(self, state: dict, end: int) -> dict:
+        return {name: end - offset for name, offset in state["consumers"].items()}
+
+    def publish(self, events: list, published: Optional[dict] = None) -> int:
+        """
+        Дописывает события в журнал. Возвращает число записанных.
+
+        Если какой-то подписчик отстал больше чем на EVENT_LOG_MAX_LAG байт,
+        второстепенные события (изменения цен) отбрасываются, а скидки
+        пишутся всегда. published (если передан) сохраняется под той же
+        блокировкой, что и события.
+        """
+        if not events and published is None:
+            return 0
+
+        with self._locked():
+            if published is not None:
+                self._write_json(self.published_path, published)
+
+            if not events:
+                return 0
+
+            state = self._load_state()
+            size = self._file_size()
+
+            # Все дочитали - можно начать файл заново
+            end = state["base"] + size
+            if size >= config.EVENT_LOG_ROTATE_BYTES and all(
+                offset >= end for offset in state["consumers"].values()
+            ):
+                open(self.path, "w").close()
+                state["base"] = end
+                size = 0
+                self._save_state(state)
+
+            lag = self._lag(state, end)
+            if lag and max(lag.values()) > config.EVENT_LOG_MAX_LAG:
+                kept = [e for e in events if e["type"] not in DROPPABLE_TYPES]
+                if len(kept) < len(events):
+                    print(f"⚠️ Подписчики отстают, отброшено событий: {len(events) - len(kept)}")
+                events = kept
+
+            if not events:
+                return 0
+
+            now = time.time()
+            with open(self.path, "a", encoding="utf-8") as f:
+                for event in events:
+                    event.setdefault("ts", now)
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+        return len(events)
+
+    def subscribe(self, consumer: str) -> int:
+        """Регистрирует подписчика с конца журнала (если его ещё нет)"""
+        with self._locked():
+            state = self._load_state()
+            if consumer not in state["consumers"]:
+                state["consumers"][consumer] = state["base"] + self._file_size()
+                self._save_state(state)
+            return state["consumers"][consumer]
+
+    def unsubscribe(self, consumer: str):
+        """Удаляет подписчика, чтобы он не сдерживал журнал"""
+        with self._locked():
+            state = self._load_state()
+            if state["consumers"].pop(consumer, None) is not None:
+                self._save_state(state)
+
+    def read(self, consumer: str, max_events: int = 100) -> tuple[list, int]:
+        """
+        Читает события после сохранённой позиции подписчика.
+
+        Returns:
+            Кортеж (события, позиция для commit)
+        """
+        with self._locked():
+            state = self._load_state()
+            offset = state["consumers"].get(consumer)
+            if offset is None:
+                raise KeyError(f"Подписчик {consumer} не зарегистрирован")
+
+            events = []
+            position = max(offset - state["base"], 0)
+            with contextlib.suppress(FileNotFoundError), open(self.path, "rb") as f:
+                f.seek(position)
+                while len(events) < max_events:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    events.append(json.loads(line))
+                    position += len(line)
+
+            return events, state["base"] + position
+
+    def commit(self, consumer: str, offset: int):
+        """Сохраняет позицию подписчика после обработки событий"""
+        with self._locked():
+            state = self._load_state()
+            if consumer in state["consumers"]:
+                state["consumers"][consumer] = offset
+                self._save_state(state)
+
+    def lag(self) -> dict:
+        """Отставание подписчиков в байтах"""
+        with self._locked():
+            state = self._load_state()
+            return self._lag(state, state["base"] + self._file_size())
+
+
+_event_log = None
+
+
+def get_event_log() -> EventLog:
+    """Общий журнал событий процесса"""
+    global _event_log
+    if _event_log is None:
+        _event_log = EventLog()
+    return _event_log
+
+
+def tail(consumer: str, poll_interval: float = 2.0):
+    """Печатает новые события по мере появления (пример подписчика)"""
+    log = get_event_log()
+    log.subscribe(consumer)
+    print(f"👂 {consumer}: жду события из {log.path}")
+    while True:
+        events, offset = log.read(consumer)
+        for event in events:
+            print(json.dumps(event, ensure_ascii=False))
+        if events:
+            log.commit(consumer, offset)
+        else:
+            time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поток событий о ценах Steam")
+    sub = parser.add_subparsers(dest="command", required=True)
+    tail_parser = sub.add_parser("tail", help="Читать новые события")
+    tail_parser.add_argument("consumer", help="Имя подписчика")
+    unsub_parser = sub.add_parser("unsubscribe", help="Удалить подписчика")
+    unsub_parser.add_argument("consumer", help="Имя подписчика")
+    sub.add_parser("lag", help="Отставание подписчиков")
+    args = parser.parse_args()
+
+    if args.command == "tail":
+        try:
+            tail(args.consumer)
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "unsubscribe":
+        get_event_log().unsubscribe(args.consumer)
+    else:
+        for name, lag in get_event_log().lag().items():
+            print(f"{name}: {lag} байт")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,15 @@ Steam Discount Bot - Модуль работы со Steam API
 Получение информации о скидках на игры
 """
 
-import requests
 import json
 import os
-from typing import Optional
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
 import config
+import events
 
 
 # Путь к файлу watchlist
@@ -18,25 +22,301 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 
+APPDETAILS_URL = "https://store.steampowered.com/api/appdetails"
 
-def get_game_details(app_id: int) -> Optional[dict]:
+# Для второго региона нужна только цена - Steam отдаёт лишь этот блок
+PRICE_ONLY_FILTER = "price_overview"
+
+# Для основного запроса - название, тип и цена (без скриншотов, видео и т.п.)
+DETAILS_FILTER = "basic,price_overview"
+
+# Для проверки существования игры хватает названия
+NAME_FILTER = "basic"
+
+# Поля appdetails, которые бот использует (описания и скриншоты не храним)
+APP_FIELDS = ("name", "type", "price_overview")
+
+# Максимум записей в кэше валидаторов (ETag/Last-Modified)
+VALIDATOR_CACHE_SIZE = 5000
+
+# Максимум игр в кэше последних известных цен
+LAST_KNOWN_CACHE_SIZE = 5000
+
+
+# === HTTP ===
+
+# Одна сессия на процесс: keep-alive для всех запросов к Steam
+# (сжатие requests/urllib3 согласуют сами, включая br/zstd при наличии модулей)
+_session = None
+_session_lock = threading.Lock()
+
+# (url, params) -> (etag, last_modified, извлечённые данные)
+_validator_cache = {}
+_stats_lock = threading.Lock()
+
+# Статистика загрузок: сколько байт пришло по сети и сколько ушло на разбор JSON
+FETCH_STATS = {
+    "requests": 0,
+    "not_modified": 0,
+    "wire_bytes": 0,
+    "body_bytes": 0,
+    "parse_time": 0.0,
+}
+
+# Подмена сетевого слоя для записи и воспроизведения ответов (см. steam_replay.py):
+# _transport(url, params) -> bytes отдаёт тело ответа вместо HTTP-запроса,
+# _recorder(url, params, body) получает каждый ответ, пришедший из сети
+_transport = None
+_recorder = None
+
+
+def _get_session():
+    """
+    Возвращает общую HTTP-сессию (создаётся при первом обращении).
+    requests импортируется здесь же, чтобы не замедлять запуск бота.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                _session = session
+    return _session
+
+
+def set_transport(transport: Optional[Callable]):
+    """Подменяет загрузку из сети (None - вернуть обычные HTTP-запросы)"""
+    global _transport
+    _transport = transport
+
+
+def set_recorder(recorder: Optional[Callable]):
+    """Включает запись сырых ответов Steam (None - выключить)"""
+    global _recorder
+    _recorder = recorder
+
+
+def _fetch_json(url: str, params: dict, timeout: float = 10,
+                extract: Optional[Callable] = None):
+    """
+    Загружает JSON из Steam с условными заголовками и сжатием.
+    
+    Если Steam вернул ETag/Last-Modified, следующий запрос отправляется с
+    If-None-Match/If-Modified-Since, и при ответе 304 используются уже
+    разобранные данные. В кэше хранится только результат extract(),
+    а не весь ответ целиком.
+    """
+    if _transport is not None:
+        body = _transport(url, params)
+        return _parse_body(body, len(body), extract)
+    
+    key = (url, tuple(sorted(params.items())))
+    # При записи нужен полный ответ, а не 304
+    cached = _validator_cache.get(key) if _recorder is None else None
+    
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    
+    response = _get_session().get(url, params=params, headers=headers, timeout=timeout)
+    
+    if response.status_code == 304 and cached:
+        with _stats_lock:
+            FETCH_STATS["requests"] += 1
+            FETCH_STATS["not_modified"] += 1
+            FETCH_STATS["wire_bytes"] += len(response.content)
+        return cached[2]
+    
+    response.raise_for_status()
+    
+    body = response.content
+    if _recorder is not None:
+        _recorder(url, params, body)
+    
+    # Сколько байт urllib3 прочитал из сокета - размер до распаковки
+    wire_bytes = response.raw.tell() or len(body)
+    data = _parse_body(body, wire_bytes, extract)
+    
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        if len(_validator_cache) >= VALIDATOR_CACHE_SIZE:
+            _validator_cache.clear()
+        _validator_cache[key] = (etag, last_modified, data)
+    
+    return data
+
+
+def _parse_body(body: bytes, wire_bytes: int, extract: Optional[Callable]):
+    """Разбирает тело ответа и учитывает его в статистике"""
+    started = time.perf_counter()
+    data = json.loads(body)
+    if extract is not None:
+        data = extract(data)
+    parse_time = time.perf_counter() - started
+    
+    with _stats_lock:
+        FETCH_STATS["requests"] += 1
+        FETCH_STATS["wire_bytes"] += wire_bytes
+        FETCH_STATS["body_bytes"] += len(body)
+        FETCH_STATS["parse_time"] += parse_time
+    
+    return data
+
+
+def _fetch_app_data(app_id: int, cc: str, filters: Optional[str] = None,
+                    timeout: Optional[float] = None) -> Optional[dict]:
+    """
+    Возвращает поля APP_FIELDS из блока data appdetails для одной игры
+    или None, если Steam ответил success=false
+    """
+    params = {"appids": app_id, "cc": cc, "l": "russian"}
+    if filters:
+        params["filters"] = filters
+    
+    def extract(payload):
+        entry = payload.get(str(app_id)) if isinstance(payload, dict) else None
+        if not entry or not entry.get("success"):
+            return None
+        # При пустом наборе полей Steam отдаёт [] вместо {}
+        data = entry.get("data") or {}
+        return {key: data[key] for key in APP_FIELDS if key in data}
+    
+    return _fetch_json(APPDETAILS_URL, params, timeout=timeout or config.STEAM_TIMEOUT, extract=extract)
+
+
+def reset_fetch_stats():
+    """Обнуляет статистику загрузок"""
+    with _stats_lock:
+        for key in FETCH_STATS:
+            FETCH_STATS[key] = 0.0 if key == "parse_time" else 0
+
+
+def get_fetch_stats() -> dict:
+    """Возвращает копию статистики загрузок"""
+    with _stats_lock:
+        return dict(FETCH_STATS)
+
+
+def format_fetch_stats(since: Optional[dict] = None) -> str:
+    """
+    Форматирует статистику загрузок для лога.
+    since - снимок get_fetch_stats() в начале прохода: тогда выводится
+    только то, что загружено после него.
+    """
+    stats = get_fetch_stats()
+    if since is not None:
+        stats = {key: value - since.get(key, 0) for key, value in stats.items()}
+    return (
+        f"запросов: {stats['requests']} (304: {stats['not_modified']}), "
+        f"по сети: {stats['wire_bytes'] / 1024:.1f} КБ, "
+        f"распаковано: {stats['body_bytes'] / 1024:.1f} КБ, "
+        f"разбор JSON: {stats['parse_time'] * 1000:.0f} мс"
+    )
+
+
+# === ДЕГРАДАЦИЯ ПРИ СБОЯХ STEAM ===
+# При воспроизведении корпуса (_transport) всё это отключено: промахи
+# корпуса - не сбои Steam, а замеры должны проходить через разбор ответов
+
+# app_id -> (время получения по time.monotonic, последний полностью
+# полученный результат get_game_details)
+_last_known = {}
+
+# Подряд идущие сбои Steam и время, до которого запросы не отправляются
+_breaker_lock = threading.Lock()
+_consecutive_failures = 0
+_breaker_open_until = 0.0
+
+
+def _steam_available() -> bool:
+    """False, пока после серии сбоев Steam не истекла пауза"""
+    return _transport is not None or time.monotonic() >= _breaker_open_until
+
+
+def _record_success():
+    global _consecutive_failures
+    if _transport is not None:
+        return
+    with _breaker_lock:
+        _consecutive_failures = 0
+
+
+def _record_failure():
+    global _consecutive_failures, _breaker_open_until
+    if _transport is not None:
+        return
+    with _breaker_lock:
+        _consecutive_failures += 1
+        if _consecutive_failures >= config.STEAM_BREAKER_FAILURES:
+            _consecutive_failures = 0
+            _breaker_open_until = time.monotonic() + config.STEAM_BREAKER_COOLDOWN
+            print(f"⚠️ Steam не отвечает, запросы приостановлены на {config.STEAM_BREAKER_COOLDOWN} с")
+
+
+def _remember(info: dict):
+    if len(_last_known) >= LAST_KNOWN_CACHE_SIZE:
+        _last_known.clear()
+    _last_known[info["app_id"]] = (time.monotonic(), info)
+
+
+def _stale_details(app_id: int) -> Optional[dict]:
+    """Последние известные цены с пометкой stale (или None, если их нет)"""
+    entry = _last_known.get(app_id) if _transport is None else None
+    if entry is None:
+        return None
+    return dict(entry[1], stale=True)
+
+
+def _recent_details(app_id: int, max_age: float) -> Optional[dict]:
+    """Цены, полученные не раньше max_age секунд назад (иначе None)"""
+    entry = _last_known.get(app_id) if _transport is None else None
+    if entry is None or time.monotonic() - entry[0] > max_age:
+        return None
+    return entry[1]
+
+
+def make_deadline(budget: float) -> float:
+    """Крайний срок (по time.monotonic) через budget секунд"""
+    return time.monotonic() + budget
+
+
+def _remaining(deadline: float) -> float:
+    """Сколько секунд осталось до крайнего срока (не больше обычного таймаута)"""
+    if _transport is not None:
+        return config.STEAM_TIMEOUT
+    return min(config.STEAM_TIMEOUT, deadline - time.monotonic())
+
+
+def get_game_details(app_id: int, deadline: Optional[float] = None) -> Optional[dict]:
     """
     Получает детальную информацию об игре из Steam Store API
     Получает цены в UAH и RUB
+    
+    Оба запроса укладываются в общий бюджет STEAM_REQUEST_BUDGET
+    (или в более ранний deadline вызывающего). Если Steam не ответил
+    вовремя, возвращаются последние известные цены с "stale": True.
     """
-    url = "https://store.steampowered.com/api/appdetails"
+    own_deadline = make_deadline(config.STEAM_REQUEST_BUDGET)
+    deadline = own_deadline if deadline is None else min(deadline, own_deadline)
     
     result = None
     
+    if not _steam_available() or _remaining(deadline) <= 0:
+        return _stale_details(app_id)
+    
     # Получаем цены в гривнах (UAH)
     try:
-        params_ua = {"appids": app_id, "cc": "ua", "l": "russian"}
-        response_ua = requests.get(url, params=params_ua, headers=HEADERS, timeout=10)
-        data_ua = response_ua.json()
+        game_data = _fetch_app_data(app_id, "ua", filters=DETAILS_FILTER,
+                                    timeout=_remaining(deadline))
         
-        if str(app_id) in data_ua and data_ua[str(app_id)]["success"]:
-            game_data = data_ua[str(app_id)]["data"]
-            
+        if game_data is not None:
             if "price_overview" not in game_data:
                 return None
                 
@@ -61,16 +341,24 @@ def get_game_details(app_id: int) -> Optional[dict]:
             }
     except Exception as e:
         print(f"Ошибка UAH для app_id {app_id}: {e}")
+        _record_failure()
+        return _stale_details(app_id)
+    
+    _record_success()
+    
+    if result is None:
         return None
     
     # Получаем цены в рублях (RUB) + наценка
+    if _remaining(deadline) <= 0:
+        # Кончилось время вызывающего, а не Steam сломался - сбоем не считаем
+        return _stale_details(app_id) or dict(result, partial=True)
+    
     try:
-        params_ru = {"appids": app_id, "cc": "ru", "l": "russian"}
-        response_ru = requests.get(url, params=params_ru, headers=HEADERS, timeout=10)
-        data_ru = response_ru.json()
+        game_data_ru = _fetch_app_data(app_id, "ru", filters=PRICE_ONLY_FILTER,
+                                       timeout=_remaining(deadline))
         
-        if str(app_id) in data_ru and data_ru[str(app_id)]["success"]:
-            game_data_ru = data_ru[str(app_id)]["data"]
+        if game_data_ru is not None:
             if "price_overview" in game_data_ru:
                 price_ru = game_data_ru["price_overview"]
                 markup = getattr(config, 'PRICE_MARKUP', 1.10)
@@ -87,28 +375,56 @@ def get_game_details(app_id: int) -> Optional[dict]:
                 result["currency"] = "₽"
     except Exception as e:
         print(f"Ошибка RUB для app_id {app_id}: {e}")
-        # Продолжаем без рублей (но тогда фильтр 500 отсечет дешевые игры в гривнах)
+        _record_failure()
+        # Лучше устаревшие рубли, чем одни гривны (фильтр 500 рассчитан на рубли)
+        stale = _stale_details(app_id)
+        if stale is not None:
+            return stale
+        # Продолжаем без рублей (но тогда фильтр 500 отсечет дешевые игры в гривнах).
+        # partial - рубли не получены из-за сбоя, а не потому что их нет
+        result["partial"] = True
+        return result
     
+    _remember(result)
     return result
 
 
+def _fetch_catalog(url: str, params: dict, deadline: float):
+    """Загружает список игр магазина в рамках бюджета и с учётом сбоев Steam"""
+    if not _steam_available():
+        raise TimeoutError("Steam временно недоступен")
+    if _remaining(deadline) <= 0:
+        raise TimeoutError("исчерпан бюджет времени")
+    
+    try:
+        data = _fetch_json(url, params, timeout=_remaining(deadline))
+    except Exception:
+        _record_failure()
+        raise
+    _record_success()
+    return data
+
+
 def get_featured_deals() -> list:
     """
     Получает список игр со скидками из нескольких источников
     
+    Весь проход, включая списки магазина, ограничен CRAWL_BUDGET:
+    после него игры берутся только из кэша последних известных цен.
+    
     Returns:
         Список игр со скидками
     """
     games = []
     app_ids = set()
+    stats_before = get_fetch_stats()
+    deadline = make_deadline(config.CRAWL_BUDGET)
     
     # === Источник 1: Featured Categories ===
     try:
         url = "https://store.steampowered.com/api/featuredcategories"
         params = {"cc": config.COUNTRY_CODE, "l": "russian"}
-        response = requests.get(url, params=params, headers=HEADERS, timeout=15)
-        response.raise_for_status()
-        data = response.json()
+        data = _fetch_catalog(url, params, deadline)
         
         # Specials (распродажи)
         if "specials" in data and "items" in data["specials"]:
@@ -133,13 +449,11 @@ def get_featured_deals() -> list:
             "l": "russian",
             "cc": config.COUNTRY_CODE,
         }
-        response = requests.get(url, params=params, headers=HEADERS, timeout=15)
-        if response.status_code == 200:
-            data = response.json()
-            if "items" in data:
-                for item in data["items"]:
-                    if "id" in item:
-                        app_ids.add(item["id"])
+        data = _fetch_catalog(url, params, deadline)
+        if "items" in data:
+            for item in data["items"]:
+                if "id" in item:
+                    app_ids.add(item["id"])
     except Exception as e:
         print(f"Ошибка storesearch: {e}")
     
@@ -148,15 +462,13 @@ def get_featured_deals() -> list:
         # Популярные новинки
         url = "https://store.steampowered.com/api/featured"
         params = {"cc": config.COUNTRY_CODE, "l": "russian"}
-        response = requests.get(url, params=params, headers=HEADERS, timeout=15)
-        if response.status_code == 200:
-            data = response.json()
-            
-            for key in ["large_capsules", "featured_win"]:
-                if key in data:
-                    for item in data[key]:
-                        if item.get("discount_percent", 0) > 0 and "id" in item:
-                            app_ids.add(item["id"])
+        data = _fetch_catalog(url, params, deadline)
+        
+        for key in ["large_capsules", "featured_win"]:
+            if key in data:
+                for item in data[key]:
+                    if item.get("discount_percent", 0) > 0 and "id" in item:
+                        app_ids.add(item["id"])
     except Exception as e:
         print(f"Ошибка featured: {e}")
     
@@ -165,7 +477,7 @@ def get_featured_deals() -> list:
     # Получаем детали для каждой игры
     count = 0
     for app_id in list(app_ids)[:100]:  # Лимит 100 игр
-        game = get_game_details(app_id)
+        game = get_game_details(app_id, deadline)
         if game and game["discount_percent"] > 0:
             games.append(game)
             count += 1
@@ -173,6 +485,7 @@ def get_featured_deals() -> list:
                 print(f"  Обработано {count} игр...")
     
     print(f"✅ Получено {len(games)} игр со скидками")
+    print(f"📶 Steam: {format_fetch_stats(stats_before)}")
     
     return games
 
@@ -232,6 +545,32 @@ def save_data(data: dict):
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 
+def warm_up() -> int:
+    """
+    Прогрев после запуска: открывает HTTP-сессию и загружает цены игр
+    из всех watchlist в кэш последних известных цен. Первая автопроверка
+    берёт их оттуда (не старше PRICE_REUSE_AGE), а при сбоях Steam они
+    служат запасным вариантом.
+    Ограничен WARMUP_BUDGET секундами. Возвращает число загруженных игр.
+    """
+    _get_session()
+    data = load_data()
+    app_ids = {
+        game["app_id"]
+        for key, games in data.items() if key != "games"
+        for game in games
+    }
+    
+    deadline = make_deadline(config.WARMUP_BUDGET)
+    loaded = 0
+    for app_id in app_ids:
+        if _remaining(deadline) <= 0:
+            break
+        if get_game_details(app_id, deadline):
+            loaded += 1
+    return loaded
+
+
 def get_user_watchlist(user_id: int) -> list:
     """Возвращает watchlist конкретного пользователя"""
     data = load_data()
@@ -259,6 +598,50 @@ def get_user_watchlist(user_id: int) -> list:
     return data.get(str_id, [])
 
 
+def _resolve_game_name(app_id: int, deadline: Optional[float] = None,
+                       bulk: bool = False) -> Optional[str]:
+    """
+    Проверяет, что игра существует, и возвращает её название.
+    Нужен один запрос: цены для этого не требуются.
+    
+    Укладывается в STEAM_REQUEST_BUDGET (или более ранний deadline)
+    и учитывается в счётчике сбоев Steam. TimeoutError - если Steam
+    недоступен или время вышло.
+    
+    bulk=True - запрос массового импорта: идёт в общем темпе
+    BULK_REQUEST_INTERVAL и не влияет на счётчик сбоев, чтобы импорт
+    одного пользователя не останавливал Steam для всех.
+    """
+    own_deadline = make_deadline(config.STEAM_REQUEST_BUDGET)
+    deadline = own_deadline if deadline is None else min(deadline, own_deadline)
+    
+    game_data = None
+    for cc in ("ua", "us"):  # Игра может быть недоступна в регионе
+        if not _steam_available():
+            raise TimeoutError("Steam временно недоступен")
+        if _remaining(deadline) <= 0:
+            raise TimeoutError("исчерпан бюджет времени")
+        if bulk:
+            _wait_bulk_slot(deadline)
+        
+        try:
+            game_data = _fetch_app_data(app_id, cc, filters=NAME_FILTER,
+                                        timeout=_remaining(deadline))
+        except Exception:
+            if not bulk:
+                _record_failure()
+            raise
+        if not bulk:
+            _record_success()
+        
+        if game_data is not None:
+            break
+    
+    if game_data is None:
+        return None
+    return game_data.get("name", f"App {app_id}")
+
+
 def add_to_watchlist(user_id: int, app_id: int) -> tuple[bool, str]:
     """
     Добавляет игру в watchlist пользователя
@@ -276,26 +659,14 @@ def add_to_watchlist(user_id: int, app_id: int) -> tuple[bool, str]:
         if game["app_id"] == app_id:
             return False, f"Игра уже в вашем списке: {game['name']}"
     
-    # Получаем информацию об игре
-    game_info = get_game_details(app_id)
+    try:
+        name = _resolve_game_name(app_id)
+    except Exception as e:
+        print(f"Ошибка при добавлении {app_id}: {e}")
+        return False, f"Не удалось получить информацию об игре {app_id}"
     
-    if not game_info:
-        try:
-            url = f"https://store.steampowered.com/api/appdetails"
-            params = {"appids": app_id, "cc": "us"}
-            response = requests.get(url, params=params, headers=HEADERS, timeout=10)
-            json_data = response.json()
-            
-            if str(app_id) in json_data and json_data[str(app_id)]["success"]:
-                game_data = json_data[str(app_id)]["data"]
-                name = game_data.get("name", f"App {app_id}")
-            else:
-                return False, f"Игра с ID {app_id} не найдена в Steam"
-        except Exception as e:
-            print(f"Ошибка при добавлении {app_id}: {e}")
-            return False, f"Не удалось получить информацию об игре {app_id}"
-    else:
-        name = game_info["name"]
+    if name is None:
+        return False, f"Игра с ID {app_id} не найдена в Steam"
     
     user_list.append({"app_id": app_id, "name": name})
     data[str_id] = user_list
@@ -304,6 +675,190 @@ def add_to_watchlist(user_id: int, app_id: int) -> tuple[bool, str]:
     return True, f"✅ Добавлено: {name}"
 
 
+# === МАССОВЫЙ ИМПОРТ/ЭКСПОРТ ===
+
+# Общий пул для проверки App ID при импорте (один на все импорты)
+_bulk_executor = None
+_bulk_lock = threading.Lock()
+# Время (time.monotonic), раньше которого следующий запрос импорта не отправляется
+_bulk_next_slot = 0.0
+
+
+def _get_bulk_executor() -> ThreadPoolExecutor:
+    """Общий пул импорта на BULK_WORKERS потоков (создаётся при первом импорте)"""
+    global _bulk_executor
+    with _bulk_lock:
+        if _bulk_executor is None:
+            _bulk_executor = ThreadPoolExecutor(max_workers=config.BULK_WORKERS,
+                                                thread_name_prefix="bulk")
+        return _bulk_executor
+
+
+def _wait_bulk_slot(deadline: float):
+    """
+    Ждёт своей очереди: все импорты вместе отправляют не больше одного
+    запроса в BULK_REQUEST_INTERVAL секунд. TimeoutError - если очередь
+    подойдёт уже после deadline.
+    """
+    global _bulk_next_slot
+    if _transport is not None:
+        return
+    with _bulk_lock:
+        now = time.monotonic()
+        slot = max(now, _bulk_next_slot)
+        if slot >= deadline:
+            raise TimeoutError("исчерпан бюджет времени")
+        _bulk_next_slot = slot + config.BULK_REQUEST_INTERVAL
+    if slot > now:
+        time.sleep(slot - now)
+
+
+APP_URL_RE = re.compile(r"/app/(\d+)")
+URL_RE = re.compile(r"https?://\S+")
+# Ссылка целиком или отдельное число
+TOKEN_RE = re.compile(r"https?://\S+|\b\d{1,10}\b")
+# Текст только из чисел и разделителей - список App ID
+ID_LIST_RE = re.compile(r"[\d\s,;]*")
+
+
+def _collect_json_app_ids(node, app_ids: list):
+    """Собирает App ID из JSON списка желаемого Steam"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "appid" and isinstance(value, (int, str)) and str(value).isdigit():
+                app_ids.append(int(value))
+            elif key.isdigit() and isinstance(value, dict):
+                # wishlistdata: {"1245620": {"name": ...}, ...}
+                app_ids.append(int(key))
+            else:
+                _collect_json_app_ids(value, app_ids)
+    elif isinstance(node, list):
+        # Список из одних чисел: [570, 730] или {"rgWishlist": [570, 730]}
+        if node and all(
+            (isinstance(item, int) and not isinstance(item, bool))
+            or (isinstance(item, str) and item.isdigit())
+            for item in node
+        ):
+            app_ids.extend(int(item) for item in node)
+            return
+        for item in node:
+            _collect_json_app_ids(item, app_ids)
+
+
+def parse_app_ids(text: str) -> list:
+    """
+    Извлекает App ID из текста: числа через пробел/запятую (и строки
+    /export), ссылки на магазин или JSON списка желаемого Steam.
+    
+    Отдельные числа берутся, только если кроме них и ссылок в тексте
+    ничего нет: в скопированном тексте цены, годы и проценты не должны
+    превращаться в App ID. Порядок сохраняется, повторы удаляются.
+    """
+    app_ids = []
+    
+    stripped = text.strip()
+    if stripped.startswith(("{", "[")):
+        try:
+            _collect_json_app_ids(json.loads(stripped), app_ids)
+        except ValueError:
+            pass
+    
+    if not app_ids:
+        # Формат экспорта: "app_id<TAB>название" - название не разбираем
+        lines = []
+        for line in text.splitlines():
+            head, sep, _ = line.partition("\t")
+            lines.append(head if sep and head.strip().isdigit() else line)
+        text = "\n".join(lines)
+        
+        only_ids = ID_LIST_RE.fullmatch(URL_RE.sub(" ", text)) is not None
+        for token in TOKEN_RE.findall(text):
+            if token.isdigit():
+                if only_ids:
+                    app_ids.append(int(token))
+            else:
+                # В ссылках бывают цифры в названии игры - берём только /app/<id>
+                match = APP_URL_RE.search(token)
+                if match:
+                    app_ids.append(int(match.group(1)))
+    
+    return list(dict.fromkeys(app_id for app_id in app_ids if app_id > 0))
+
+
+def add_many_to_watchlist(user_id: int, app_ids: list) -> dict:
+    """
+    Добавляет сразу много игр: все App ID проверяются в общем пуле импорта
+    (BULK_WORKERS потоков, не чаще запроса в BULK_REQUEST_INTERVAL),
+    а файл записывается один раз. Проверка ограничена BULK_IMPORT_BUDGET,
+    а после STEAM_BREAKER_FAILURES сбоев подряд импорт прекращает запросы:
+    не проверенные App ID попадают в "failed" (попробовать позже).
+    
+    Returns:
+        Словарь {"added": [названия], "existing": [названия],
+                 "not_found": [app_id], "failed": [app_id], "skipped": число}
+    """
+    str_id = str(user_id)
+    result = {"added": [], "existing": [], "not_found": [], "failed": [], "skipped": 0}
+    
+    if len(app_ids) > config.BULK_IMPORT_LIMIT:
+        result["skipped"] = len(app_ids) - config.BULK_IMPORT_LIMIT
+        app_ids = app_ids[:config.BULK_IMPORT_LIMIT]
+    
+    # Через get_user_watchlist, чтобы сработала миграция старого формата
+    known = {game["app_id"]: game["name"] for game in get_user_watchlist(user_id)}
+    to_check = [app_id for app_id in app_ids if app_id not in known]
+    result["existing"] = [known[app_id] for app_id in app_ids if app_id in known]
+    
+    deadline = make_deadline(config.BULK_IMPORT_BUDGET)
+    # Сбои подряд в этом импорте (общий счётчик сбоев Steam не трогаем)
+    failures = {"count": 0}
+    failures_lock = threading.Lock()
+    
+    def resolve(app_id):
+        if failures["count"] >= config.STEAM_BREAKER_FAILURES:
+            return app_id, None, TimeoutError("Steam не отвечает, импорт остановлен")
+        try:
+            name = _resolve_game_name(app_id, deadline, bulk=True)
+        except Exception as e:
+            with failures_lock:
+                failures["count"] += 1
+            return app_id, None, e
+        with failures_lock:
+            failures["count"] = 0
+        return app_id, name, None
+    
+    resolved = []
+    for app_id, name, error in _get_bulk_executor().map(resolve, to_check):
+        if error is not None:
+            print(f"Ошибка при добавлении {app_id}: {error}")
+            result["failed"].append(app_id)
+        elif name is None:
+            result["not_found"].append(app_id)
+        else:
+            resolved.append({"app_id": app_id, "name": name})
+    
+    if resolved:
+        # Перечитываем файл: пока шла проверка, список мог измениться
+        data = load_data()
+        user_list = data.setdefault(str_id, [])
+        present = {game["app_id"] for game in user_list}
+        for game in resolved:
+            if game["app_id"] in present:
+                result["existing"].append(game["name"])
+            else:
+                user_list.append(game)
+                result["added"].append(game["name"])
+        save_data(data)
+    
+    return result
+
+
+def export_watchlist(user_id: int) -> Iterator[str]:
+    """Построчно отдаёт watchlist пользователя: "app_id<TAB>название" """
+    for game in get_user_watchlist(user_id):
+        yield f"{game['app_id']}\t{game['name']}\n"
+
+
 def remove_from_watchlist(user_id: int, app_id: int) -> tuple[bool, str]:
     """Удаляет игру из watchlist пользователя"""
     data = load_data()
@@ -325,12 +880,16 @@ def remove_from_watchlist(user_id: int, app_id: int) -> tuple[bool, str]:
 
 
 def check_user_deals(user_id: int) -> list:
-    """Проверяет скидки для конкретного пользователя"""
+    """
+    Проверяет скидки для конкретного пользователя
+    Укладывается в USER_REQUEST_BUDGET, дальше - цены из кэша
+    """
     user_list = get_user_watchlist(user_id)
     deals = []
+    deadline = make_deadline(config.USER_REQUEST_BUDGET)
     
     for game in user_list:
-        info = get_game_details(game["app_id"])
+        info = get_game_details(game["app_id"], deadline)
         if info and info["discount_percent"] >= config.MIN_DISCOUNT:
             deals.append(info)
             
@@ -350,6 +909,7 @@ def check_all_users_deals() -> dict:
     # Оптимизация: кэшировать результаты get_game_details
     
     game_cache = {} # app_id -> info
+    watchers = {}  # app_id -> число пользователей
     
     for user_id, games in data.items():
         if user_id == "games": continue # Skip legacy key if exists
@@ -357,11 +917,13 @@ def check_all_users_deals() -> dict:
         user_deals = []
         for game in games:
             app_id = game["app_id"]
+            watchers[app_id] = watchers.get(app_id, 0) + 1
             
             if app_id in game_cache:
                 info = game_cache[app_id]
             else:
-                info = get_game_details(app_id)
+                # Только что загруженные цены (например, прогревом) не запрашиваем снова
+                info = _recent_details(app_id, config.PRICE_REUSE_AGE) or get_game_details(app_id)
                 if info:
                     game_cache[app_id] = info
             
@@ -370,12 +932,140 @@ def check_all_users_deals() -> dict:
         
         if user_deals:
             all_deals[user_id] = user_deals
+    
+    publish_price_events(game_cache, watchers)
             
     return all_deals
 
 
-def format_game_message(game: dict) -> str:
-    """Форматирует информацию об игре для вывода"""
+# === СОБЫТИЯ ===
+
+# Максимум игр в сохранённом состоянии опубликованных цен
+PUBLISHED_PRICES_LIMIT = 5000
+
+# Опубликованное состояние (загружается из журнала при первой публикации):
+# "prices" - последние цены, "deals" - скидки, о которых уже сообщили;
+# app_id -> (final_price, discount_percent, currency)
+_published = None
+
+
+def _load_published() -> dict:
+    """Состояние опубликованных цен, сохранённое до перезапуска"""
+    global _published
+    if _published is None:
+        raw = events.get_event_log().load_published()
+        _published = {
+            kind: {int(app_id): tuple(price) for app_id, price in raw.get(kind, {}).items()}
+            for kind in ("prices", "deals")
+        }
+    return _published
+
+
+def _set_published(table: dict, app_id: int, price: tuple):
+    """Запоминает цену; самые давние записи сверх лимита удаляются"""
+    table.pop(app_id, None)
+    table[app_id] = price
+    while len(table) > PUBLISHED_PRICES_LIMIT:
+        del table[next(iter(table))]
+
+
+def _price_event(event_type: str, info: dict, watchers: int) -> dict:
+    """Событие о цене игры для журнала"""
+    return {
+        "type": event_type,
+        "app_id": info["app_id"],
+        "name": info["name"],
+        "url": info["url"],
+        "currency": info.get("currency"),
+        "original_price": round(info["original_price"], 2),
+        "final_price": round(info["final_price"], 2),
+        "discount_percent": info["discount_percent"],
+        "watchers": watchers,
+    }
+
+
+def publish_price_events(infos: dict, watchers: dict) -> int:
+    """
+    Публикует в журнал событий изменения цен и новые скидки
+    по уже полученным данным (без дополнительных запросов к Steam).
+    Возвращает число записанных событий.
+    """
+    # Ответы из корпуса (steam_replay.py) - не настоящие цены
+    if not config.EVENT_LOG_PATH or _transport is not None:
+        return 0
+    
+    try:
+        published = _load_published()
+        prices, deals = published["prices"], published["deals"]
+        
+        new_events = []
+        for app_id, info in infos.items():
+            # Цены из кэша или без рублей из-за сбоя Steam - не новая информация
+            # (у неполных данных ещё и другая валюта)
+            if info.get("stale") or info.get("partial"):
+                continue
+            
+            price = (info["final_price"], info["discount_percent"], info.get("currency"))
+            count = watchers.get(app_id, 0)
+            
+            old_price = prices.get(app_id)
+            if old_price is not None and old_price != price:
+                event = _price_event(events.PRICE_CHANGE, info, count)
+                event["old_final_price"] = round(old_price[0], 2)
+                event["old_discount_percent"] = old_price[1]
+                new_events.append(event)
+            _set_published(prices, app_id, price)
+            
+            if info["discount_percent"] < config.MIN_DISCOUNT:
+                # Скидка кончилась - если она вернётся, это снова новая скидка
+                deals.pop(app_id, None)
+            elif deals.get(app_id) != price:
+                new_events.append(_price_event(events.DEAL, info, count))
+                _set_published(deals, app_id, price)
+        
+        state = {
+            kind: {str(app_id): list(price) for app_id, price in table.items()}
+            for kind, table in published.items()
+        }
+        return events.get_event_log().publish(new_events, state)
+    except Exception as e:
+        print(f"Ошибка записи событий: {e}")
+        return 0
+
+
+# === СООБЩЕНИЯ ===
+
+# Шаблоны сообщений: имя -> заголовок перед карточкой игры
+MESSAGE_TEMPLATES = {
+    "deal": "",
+    "notify": "🎉 *Новая скидка на игру из вашего списка!*\n\n",
+}
+
+# Максимум игр в кэше отрисованных сообщений
+RENDER_CACHE_SIZE = 5000
+
+# app_id -> (версия цены, {шаблон: текст})
+_render_cache = {}
+_render_lock = threading.Lock()
+
+
+def _price_version(game: dict) -> tuple:
+    """Всё, от чего зависит текст карточки: при изменении цены меняется версия"""
+    return (
+        game["name"],
+        game["discount_percent"],
+        game["original_price"],
+        game["final_price"],
+        game.get("uah_original"),
+        game.get("uah_final"),
+        game.get("rub_original"),
+        game.get("rub_final"),
+        game.get("stale", False),
+    )
+
+
+def _render_game_message(game: dict) -> str:
+    """Собирает карточку игры в Markdown"""
     
     # Формируем строку с ценами
     prices = ""
@@ -392,6 +1082,10 @@ def format_game_message(game: dict) -> str:
     elif config.COUNTRY_CODE == "ru":
          prices += f"🇷🇺 ~~{game['original_price']:.0f}~~ → *{game['final_price']:.0f} ₽*\n"
 
+    # Steam не ответил - показываем последние известные цены
+    if game.get("stale"):
+        prices += "⏳ _Цены могут быть устаревшими_\n"
+
     return (
         f"🎮 *{game['name']}*\n"
         f"{prices}"
@@ -400,6 +1094,45 @@ def format_game_message(game: dict) -> str:
     )
 
 
+
+def clear_render_cache():
+    """Сбрасывает кэш отрисованных сообщений"""
+    with _render_lock:
+        _render_cache.clear()
+
+
+def format_game_message(game: dict, template: str = "deal") -> str:
+    """
+    Форматирует информацию об игре для вывода.
+    
+    Текст кэшируется по (app_id, версия цены, шаблон): одна и та же скидка
+    для тысяч пользователей отрисовывается один раз. Если цена изменилась,
+    все шаблоны этой игры сбрасываются.
+    """
+    app_id = game["app_id"]
+    version = _price_version(game)
+    
+    with _render_lock:
+        entry = _render_cache.get(app_id)
+        if entry is None or entry[0] != version:
+            if len(_render_cache) >= RENDER_CACHE_SIZE:
+                _render_cache.clear()
+            entry = (version, {})
+            _render_cache[app_id] = entry
+        
+        rendered = entry[1]
+        text = rendered.get(template)
+        if text is None:
+            body = rendered.get("deal")
+            if body is None:
+                body = _render_game_message(game)
+                rendered["deal"] = body
+            text = MESSAGE_TEMPLATES[template] + body
+            rendered[template] = text
+    
+    return text
+
+
 if __name__ == "__main__":
     # Тест модуля
     print("=== Steam Discount Bot - Тест ===\n")
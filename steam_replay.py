@@ -0,0 +1,206 @@
+"""
+Steam Discount Bot - Запись и воспроизведение ответов Steam
+Позволяет профилировать разбор и фильтрацию без сети
+
+Запись (один проход по реальному Steam):
+    python steam_replay.py record
+
+Воспроизведение с профилированием:
+    python steam_replay.py replay --iterations 20 --profile --tracemalloc
+"""
+
+import argparse
+import contextlib
+import cProfile
+import gzip
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+import steam_bot
+
+
+# Корпус ответов по умолчанию (gzip, одна JSON-запись на строку)
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "steam_corpus.jsonl.gz")
+
+
+def _corpus_key(url: str, params: dict) -> tuple:
+    """Ключ ответа в корпусе (порядок параметров не важен)"""
+    return url, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+class Recorder:
+    """Пишет сырые ответы Steam в сжатый корпус"""
+
+    def __init__(self, path: str = CORPUS_PATH):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+
+    def __call__(self, url: str, params: dict, body: bytes):
+        record = {
+            "url": url,
+            "params": {k: str(v) for k, v in params.items()},
+            "body": body.decode("utf-8"),
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.count += 1
+
+    def close(self):
+        self._file.close()
+
+
+class ReplayTransport:
+    """Отдаёт ответы из корпуса вместо HTTP-запросов"""
+
+    def __init__(self, path: str = CORPUS_PATH):
+        self.responses = {}
+        self.misses = 0
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                key = _corpus_key(record["url"], record["params"])
+                self.responses[key] = record["body"].encode("utf-8")
+
+    def __call__(self, url: str, params: dict) -> bytes:
+        body = self.responses.get(_corpus_key(url, params))
+        if body is None:
+            self.misses += 1
+            raise LookupError(f"Нет ответа в корпусе: {url} {params}")
+        return body
+
+
+def run_pipeline() -> dict:
+    """
+    Полный проход бота: поиск скидок, фильтр, форматирование,
+    проверка watchlist всех пользователей
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    games = steam_bot.get_featured_deals()
+    timings["get_featured_deals"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    filtered_games, filtered_dlc = steam_bot.filter_games(games)
+    timings["filter_games"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    all_deals = steam_bot.check_all_users_deals()
+    timings["check_all_users_deals"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    messages = [steam_bot.format_game_message(g) for g in filtered_games + filtered_dlc]
+    for deals in all_deals.values():
+        messages.extend(steam_bot.format_game_message(g) for g in deals)
+    timings["format_game_message"] = time.perf_counter() - started
+
+    timings["games"] = len(games)
+    timings["messages"] = len(messages)
+    return timings
+
+
+def record(path: str = CORPUS_PATH):
+    """Проходит пайплайн по реальному Steam и сохраняет все ответы"""
+    recorder = Recorder(path)
+    steam_bot.set_recorder(recorder)
+    try:
+        run_pipeline()
+    finally:
+        steam_bot.set_recorder(None)
+        recorder.close()
+
+    size = os.path.getsize(path)
+    print(f"💾 Записано ответов: {recorder.count} ({size / 1024:.1f} КБ) -> {path}")
+
+
+def replay(path: str = CORPUS_PATH, iterations: int = 1, profile: bool = False,
+           trace_memory: bool = False, top: int = 20):
+    """Прогоняет корпус через пайплайн и печатает отчёт"""
+    if iterations < 1:
+        raise ValueError("iterations должно быть не меньше 1")
+    transport = ReplayTransport(path)
+    print(f"📂 Корпус: {len(transport.responses)} ответов из {path}")
+
+    profiler = cProfile.Profile() if profile else None
+    if trace_memory:
+        tracemalloc.start()
+
+    totals = {}
+    steam_bot.set_transport(transport)
+    steam_bot.reset_fetch_stats()
+    try:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            # Каждый прогон - с холодным кэшем, иначе замеряются попадания в кэш
+            steam_bot.clear_render_cache()
+            # Вывод пайплайна только мешает замерам
+            with contextlib.redirect_stdout(io.StringIO()):
+                if profiler:
+                    profiler.enable()
+                timings = run_pipeline()
+                if profiler:
+                    profiler.disable()
+            for name, value in timings.items():
+                totals[name] = totals.get(name, 0) + value
+        elapsed = time.perf_counter() - started
+    finally:
+        steam_bot.set_transport(None)
+
+    # Снимок памяти до построения отчётов, чтобы они не попали в статистику
+    if trace_memory:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"\n=== Воспроизведение: {iterations} прогон(ов), {elapsed:.3f} с ===")
+    for name in ["get_featured_deals", "filter_games", "check_all_users_deals", "format_game_message"]:
+        print(f"  {name:<24} {totals[name] / iterations * 1000:8.2f} мс/прогон")
+    print(f"  Игр за прогон: {totals['games'] // iterations}, сообщений: {totals['messages'] // iterations}")
+    print(f"  Steam: {steam_bot.format_fetch_stats()}")
+    if transport.misses:
+        print(f"  ⚠️ Нет в корпусе: {transport.misses} запросов")
+
+    if profiler:
+        print(f"\n=== cProfile (топ {top} по cumulative) ===")
+        pstats.Stats(profiler).strip_dirs().sort_stats("cumulative").print_stats(top)
+
+    if trace_memory:
+        print(f"\n=== tracemalloc: сейчас {current / 1024:.1f} КБ, пик {peak / 1024:.1f} КБ ===")
+        for stat in snapshot.statistics("lineno")[:top]:
+            print(f"  {stat}")
+
+
+def positive_int(value: str) -> int:
+    """Целое число >= 1 для argparse"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("должно быть не меньше 1")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запись и воспроизведение ответов Steam")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="Файл корпуса (.jsonl.gz)")
+    parser.add_argument("--iterations", type=positive_int, default=1, help="Число прогонов при воспроизведении")
+    parser.add_argument("--profile", action="store_true", help="Включить cProfile")
+    parser.add_argument("--tracemalloc", action="store_true", help="Включить tracemalloc")
+    parser.add_argument("--top", type=int, default=20, help="Сколько строк показывать в отчётах")
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        record(args.corpus)
+    else:
+        replay(args.corpus, args.iterations, args.profile, args.tracemalloc, args.top)
+
+
+if __name__ == "__main__":
+    main()
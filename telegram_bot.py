@@ -1,3 +1,8 @@
+import time
+
+# Отсчёт времени запуска - до импорта тяжёлых модулей
+_STARTED = time.perf_counter()
+
 from telegram import (
     Update, 
     InlineKeyboardButton, 
@@ -16,6 +21,8 @@ from telegram.constants import ParseMode
 
 import logging
 import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
 import config
 import steam_bot
 
@@ -26,18 +33,92 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Фазы запуска: (название, секунды от старта процесса)
+startup_phases = [("импорт модулей", time.perf_counter() - _STARTED)]
+
+
+def mark_startup_phase(name: str):
+    """Запоминает момент окончания фазы запуска"""
+    startup_phases.append((name, time.perf_counter() - _STARTED))
+
+
+def format_startup_phases() -> str:
+    """Форматирует фазы запуска для лога"""
+    return ", ".join(f"{name}: {elapsed * 1000:.0f} мс" for name, elapsed in startup_phases)
+
 # Храним уже отправленные уведомления (чтобы не спамить)
 notified_deals = set()
 
-async def post_init(application: Application):
-    """Настройка бота при запуске (добавление меню команд)"""
+# Потоки для запросов пользователей к Steam: их число ограничено,
+# а лишние запросы сразу получают отказ вместо бесконечной очереди
+steam_executor = ThreadPoolExecutor(max_workers=config.STEAM_WORKERS, thread_name_prefix="steam")
+_pending_steam = 0
+
+OVERLOAD_TEXT = "⏳ Бот сейчас перегружен, попробуйте позже."
+
+
+class Overloaded(Exception):
+    """Очередь запросов к Steam заполнена"""
+
+
+async def run_steam(func, *args):
+    """Выполняет запрос к Steam в ограниченном пуле или отказывает при перегрузке"""
+    global _pending_steam
+    if _pending_steam >= config.STEAM_QUEUE_LIMIT:
+        raise Overloaded()
+    
+    _pending_steam += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(steam_executor, func, *args)
+    finally:
+        _pending_steam -= 1
+
+
+# Готовые инлайн-клавиатуры: (действие, app_id) -> InlineKeyboardMarkup
+_keyboard_cache = {}
+
+# Максимум клавиатур в кэше
+KEYBOARD_CACHE_SIZE = 5000
+
+KEYBOARD_LABELS = {
+    "add": "➕ Добавить",
+    "del": "❌ Удалить",
+}
+
+
+def get_keyboard(action: str, app_id: int) -> InlineKeyboardMarkup:
+    """Возвращает клавиатуру с одной кнопкой (строится один раз на игру)"""
+    key = (action, app_id)
+    keyboard = _keyboard_cache.get(key)
+    if keyboard is None:
+        if len(_keyboard_cache) >= KEYBOARD_CACHE_SIZE:
+            _keyboard_cache.clear()
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton(KEYBOARD_LABELS[action], callback_data=f"{action}_{app_id}")]
+        ])
+        _keyboard_cache[key] = keyboard
+    return keyboard
+
+async def register_commands(context: ContextTypes.DEFAULT_TYPE):
+    """Добавление меню команд (задачей job_queue, не задерживает приём апдейтов)"""
     commands = [
         BotCommand("check", "🔍 Проверить скидки"),
         BotCommand("watchlist", "📋 Мой список"),
         BotCommand("help", "ℹ️ Справка"),
     ]
-    await application.bot.set_my_commands(commands)
-    print("✅ Меню команд обновлено")
+    try:
+        await context.bot.set_my_commands(commands)
+        print("✅ Меню команд обновлено")
+    except Exception as e:
+        logger.error(f"Не удалось обновить меню команд: {e}")
+
+
+async def post_init(application: Application):
+    """Настройка бота при запуске"""
+    application.job_queue.run_once(register_commands, when=0)
+    mark_startup_phase("инициализация")
+    logger.info(f"Запуск: {format_startup_phases()}")
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -54,17 +135,6 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(welcome_text, parse_mode=ParseMode.MARKDOWN)
 
 
-# ... (rest of the code)
-
-def main():
-    # ... (start of main)
-    
-    # Создаём приложение
-    app = Application.builder().token(config.TELEGRAM_TOKEN).post_init(post_init).build()
-    
-    # ... (handlers)
-
-
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /help"""
     help_text = (
@@ -77,7 +147,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "`/add 1245620`\n\n"
         "*3. Проверить скидки:*\n"
         "`/check` - покажет все выгодные скидки\n\n"
-        "*4. Автоуведомления:*\n"
+        "*4. Много игр сразу:*\n"
+        "`/import 1245620 570 ...`, ссылки из магазина или файл .txt/.json "
+        "со списком желаемого\n"
+        "`/export` - выгрузить ваш список файлом\n\n"
+        "*5. Автоуведомления:*\n"
         "Бот сам пришлёт уведомление, когда на игру из вашего списка будет скидка!"
     )
     
@@ -93,7 +167,7 @@ async def check_deals(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Выполняем тяжелые запросы в отдельном потоке
-        games = await loop.run_in_executor(None, steam_bot.get_featured_deals)
+        games = await run_steam(steam_bot.get_featured_deals)
         filtered_games, filtered_dlc = await loop.run_in_executor(None, steam_bot.filter_games, games)
         
         total = len(filtered_games) + len(filtered_dlc)
@@ -113,9 +187,7 @@ async def check_deals(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             for game in filtered_games[:8]:  # Максимум 8 игр
                 msg = steam_bot.format_game_message(game)
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("➕ Добавить", callback_data=f"add_{game['app_id']}")]
-                ])
+                keyboard = get_keyboard("add", game["app_id"])
                 await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard)
                 await asyncio.sleep(0.3)
             
@@ -129,9 +201,7 @@ async def check_deals(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             for dlc in filtered_dlc[:5]:  # Максимум 5 DLC
                 msg = steam_bot.format_game_message(dlc)
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("➕ Добавить", callback_data=f"add_{dlc['app_id']}")]
-                ])
+                keyboard = get_keyboard("add", dlc["app_id"])
                 await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard)
                 await asyncio.sleep(0.3)
             
@@ -140,7 +210,7 @@ async def check_deals(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Проверяем watchlist пользователя
         # Используем check_user_deals вместо check_watchlist_deals
-        watchlist_deals = await loop.run_in_executor(None, steam_bot.check_user_deals, user_id)
+        watchlist_deals = await run_steam(steam_bot.check_user_deals, user_id)
         
         if watchlist_deals:
             await update.message.reply_text(
@@ -151,6 +221,8 @@ async def check_deals(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 msg = steam_bot.format_game_message(game)
                 await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN)
 
+    except Overloaded:
+        await update.message.reply_text(OVERLOAD_TEXT)
     except Exception as e:
         logger.error(f"Ошибка в check_deals: {e}")
         await update.message.reply_text("❌ Ошибка при поиске скидок.")
@@ -172,11 +244,16 @@ async def show_watchlist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text("📋 *Ваш список отслеживания:*", parse_mode=ParseMode.MARKDOWN)
     
-    loop = asyncio.get_running_loop()
+    # Общий срок на весь список: дальше цены берутся из кэша
+    deadline = steam_bot.make_deadline(config.USER_REQUEST_BUDGET)
     
     for i, game in enumerate(watchlist, 1):
         # Получаем данные асинхронно
-        info = await loop.run_in_executor(None, steam_bot.get_game_details, game["app_id"])
+        try:
+            info = await run_steam(steam_bot.get_game_details, game["app_id"], deadline)
+        except Overloaded:
+            await update.message.reply_text(OVERLOAD_TEXT)
+            return
         
         if info and info["discount_percent"] > 0:
             price_info = f"🔥 -{info['discount_percent']}% ({info['final_price']:.0f} {info.get('currency', 'rub')})"
@@ -184,12 +261,13 @@ async def show_watchlist(update: Update, context: ContextTypes.DEFAULT_TYPE):
             price_info = f"{info['original_price']:.0f} {info.get('currency', 'rub')}"
         else:
             price_info = "цена неизвестна"
+        
+        if info and info.get("stale"):
+            price_info += " ⏳"
             
         text = f"{i}. *{game['name']}*\nID: `{game['app_id']}` | {price_info}"
         
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Удалить", callback_data=f"del_{game['app_id']}")]
-        ])
+        keyboard = get_keyboard("del", game["app_id"])
         
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=keyboard)
 
@@ -214,16 +292,115 @@ async def add_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text("🔍 Ищу игру...")
     
-    loop = asyncio.get_running_loop()
-    
     try:
-        success, message = await loop.run_in_executor(None, steam_bot.add_to_watchlist, user_id, app_id)
+        success, message = await run_steam(steam_bot.add_to_watchlist, user_id, app_id)
         await update.message.reply_text(message)
+    except Overloaded:
+        await update.message.reply_text(OVERLOAD_TEXT)
     except Exception as e:
         logger.error(f"Ошибка при добавлении игры: {e}")
         await update.message.reply_text("❌ Внутренняя ошибка при добавлении игры.")
 
 
+# Максимальный размер файла для импорта (в байтах)
+IMPORT_FILE_LIMIT = 1024 * 1024
+
+
+def format_import_result(result: dict) -> str:
+    """Итог массового импорта одним сообщением"""
+    lines = [f"✅ Добавлено: {len(result['added'])}"]
+    if result["existing"]:
+        lines.append(f"📋 Уже в списке: {len(result['existing'])}")
+    if result["not_found"]:
+        ids = ", ".join(str(app_id) for app_id in result["not_found"][:20])
+        lines.append(f"❓ Не найдены в Steam: {ids}")
+    if result["failed"]:
+        ids = ", ".join(str(app_id) for app_id in result["failed"][:20])
+        lines.append(f"⚠️ Не удалось проверить (попробуйте позже): {ids}")
+    if result["skipped"]:
+        lines.append(f"✂️ Пропущено сверх лимита {config.BULK_IMPORT_LIMIT}: {result['skipped']}")
+    return "\n".join(lines)
+
+
+async def run_import(update: Update, text: str):
+    """Разбирает текст, проверяет все App ID одним проходом и сохраняет"""
+    app_ids = steam_bot.parse_app_ids(text)
+    
+    if not app_ids:
+        await update.message.reply_text(
+            "❌ Не нашёл ни одного App ID.\n"
+            "Пришлите только числа через пробел/запятую, ссылки на игры "
+            "в магазине или JSON списка желаемого."
+        )
+        return
+    
+    await update.message.reply_text(f"🔍 Проверяю {len(app_ids)} игр...")
+    
+    user_id = update.effective_user.id
+    
+    try:
+        result = await run_steam(steam_bot.add_many_to_watchlist, user_id, app_ids)
+        await update.message.reply_text(format_import_result(result))
+    except Overloaded:
+        await update.message.reply_text(OVERLOAD_TEXT)
+    except Exception as e:
+        logger.error(f"Ошибка при импорте: {e}")
+        await update.message.reply_text("❌ Внутренняя ошибка при импорте.")
+
+
+async def import_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /import <app_id ...> - добавить много игр сразу"""
+    # Список можно передать аргументами или ответом на сообщение со списком
+    text = " ".join(context.args)
+    reply = update.message.reply_to_message
+    if not text and reply:
+        text = reply.text or reply.caption or ""
+    
+    if not text:
+        await update.message.reply_text(
+            "❌ Укажите App ID или ссылки на игры.\n"
+            "Пример: `/import 1245620 570 730`\n"
+            "Можно также прислать файл .txt или .json",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+    
+    await run_import(update, text)
+
+
+async def import_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Импорт из присланного файла (.txt или .json)"""
+    document = update.message.document
+    
+    if document.file_size and document.file_size > IMPORT_FILE_LIMIT:
+        await update.message.reply_text("❌ Файл слишком большой (максимум 1 МБ)")
+        return
+    
+    file = await document.get_file()
+    content = await file.download_as_bytearray()
+    await run_import(update, bytes(content).decode("utf-8", errors="ignore"))
+
+
+async def export_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /export - выгрузить список файлом"""
+    user_id = update.effective_user.id
+    
+    buffer = io.BytesIO()
+    for line in steam_bot.export_watchlist(user_id):
+        buffer.write(line.encode("utf-8"))
+    
+    if not buffer.tell():
+        await update.message.reply_text("📋 Ваш список отслеживания пуст.")
+        return
+    
+    buffer.seek(0)
+    await update.message.reply_document(
+        document=buffer,
+        filename="watchlist.txt",
+        caption="📋 Ваш список. Его можно снова загрузить через /import"
+    )
+
+
 async def remove_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /remove <app_id> - удалить игру"""
     user_id = update.effective_user.id
@@ -250,8 +427,11 @@ async def auto_check_deals(context: ContextTypes.DEFAULT_TYPE):
     """Автоматическая проверка скидок для ВСЕХ пользователей"""
     global notified_deals
     
-    # Получаем словарь {user_id: [deals]}
-    all_users_deals = steam_bot.check_all_users_deals()
+    # Получаем словарь {user_id: [deals]} - в отдельном потоке, чтобы не блокировать бота
+    loop = asyncio.get_running_loop()
+    stats_before = steam_bot.get_fetch_stats()
+    all_users_deals = await loop.run_in_executor(None, steam_bot.check_all_users_deals)
+    logger.info(f"Автопроверка завершена, Steam: {steam_bot.format_fetch_stats(stats_before)}")
     
     for user_id, games in all_users_deals.items():
         if not games: continue
@@ -263,10 +443,8 @@ async def auto_check_deals(context: ContextTypes.DEFAULT_TYPE):
             if deal_key not in notified_deals:
                 notified_deals.add(deal_key)
                 
-                msg = (
-                    "🎉 *Новая скидка на игру из вашего списка!*\n\n" +
-                    steam_bot.format_game_message(game)
-                )
+                # Текст общий для всех получателей этой скидки и берётся из кэша
+                msg = steam_bot.format_game_message(game, "notify")
                 
                 try:
                     await context.bot.send_message(
@@ -278,6 +456,17 @@ async def auto_check_deals(context: ContextTypes.DEFAULT_TYPE):
                     logger.error(f"Ошибка отправки уведомления пользователю {user_id}: {e}")
 
 
+async def warm_up(context: ContextTypes.DEFAULT_TYPE):
+    """Отложенный прогрев: HTTP-сессия Steam и цены игр из watchlist"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        total = await loop.run_in_executor(None, steam_bot.warm_up)
+        logger.info(f"Прогрев завершён за {(time.perf_counter() - started) * 1000:.0f} мс, загружено цен: {total}")
+    except Exception as e:
+        logger.error(f"Ошибка прогрева: {e}")
+
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработка нажатий на инлайн-кнопки"""
     query = update.callback_query
@@ -289,14 +478,15 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if data.startswith("add_"):
         app_id = int(data.split("_")[1])
         # Используем executor для асинхронности
-        loop = asyncio.get_running_loop()
         try:
-            success, message = await loop.run_in_executor(None, steam_bot.add_to_watchlist, user_id, app_id)
+            success, message = await run_steam(steam_bot.add_to_watchlist, user_id, app_id)
             if success:
                 new_text = query.message.text + f"\n\n✅ Добавлено!"
                 await query.edit_message_text(text=new_text, parse_mode=ParseMode.MARKDOWN)
             else:
                  await query.message.reply_text(message)
+        except Overloaded:
+            await query.message.reply_text(OVERLOAD_TEXT)
         except Exception as e:
             logger.error(f"Ошибка кнопки add: {e}")
             await query.message.reply_text("❌ Ошибка при добавлении.")
@@ -337,7 +527,8 @@ def main():
         return
     
     # Создаём приложение
-    app = Application.builder().token(config.TELEGRAM_TOKEN).build()
+    app = Application.builder().token(config.TELEGRAM_TOKEN).post_init(post_init).build()
+    mark_startup_phase("создание приложения")
     
     # Добавляем обработчик ошибок
     app.add_error_handler(error_handler)
@@ -350,16 +541,28 @@ def main():
     app.add_handler(CommandHandler("list", show_watchlist))  # Алиас
     app.add_handler(CommandHandler("add", add_game))
     app.add_handler(CommandHandler("remove", remove_game))
+    app.add_handler(CommandHandler("import", import_games))
+    app.add_handler(CommandHandler("export", export_games))
+    
+    # Файлы со списком игр
+    app.add_handler(MessageHandler(
+        filters.Document.FileExtension("txt") | filters.Document.FileExtension("json"),
+        import_file
+    ))
     
     # Обработчик инлайн-кнопок
     app.add_handler(CallbackQueryHandler(button_handler))
     
-    # Добавляем автоматическую проверку
+    mark_startup_phase("регистрация обработчиков")
+    
+    # Прогрев и первая автопроверка разнесены по времени,
+    # чтобы не занимать бота в первые секунды после запуска
     job_queue = app.job_queue
+    job_queue.run_once(warm_up, when=config.WARMUP_DELAY)
     job_queue.run_repeating(
         auto_check_deals, 
         interval=config.CHECK_INTERVAL,
-        first=60
+        first=config.FIRST_CHECK_DELAY
     )
     print(f"\n✅ Автопроверка включена (каждые {config.CHECK_INTERVAL // 60} мин)")
     